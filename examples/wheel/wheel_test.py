@@ -103,6 +103,33 @@ class WheelTest(unittest.TestCase):
             filename, "273e27adf9bf90287a42ac911dcece8aa95f2905c37d786725477b26de23627c"
         )
 
+    def test_compression_stored_wheel(self):
+        filename = self._get_path(
+            "example_compression_stored-0.0.1-py3-none-any.whl",
+        )
+        with zipfile.ZipFile(filename) as zf:
+            self.assertAllEntriesHasReproducibleMetadata(zf)
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(
+                zf.namelist(),
+                [
+                    "examples/wheel/lib/data.txt",
+                    "examples/wheel/lib/module_with_data.py",
+                    "examples/wheel/lib/simple_module.py",
+                    "examples/wheel/main.py",
+                    "example_compression_stored-0.0.1.dist-info/WHEEL",
+                    "example_compression_stored-0.0.1.dist-info/METADATA",
+                    "example_compression_stored-0.0.1.dist-info/RECORD",
+                ],
+            )
+            for zinfo in zf.infolist():
+                self.assertEqual(
+                    zinfo.compress_type, zipfile.ZIP_STORED, msg=zinfo.filename
+                )
+                self.assertEqual(
+                    zinfo.compress_size, zinfo.file_size, msg=zinfo.filename
+                )
+
     def test_customized_wheel(self):
         filename = self._get_path(
             "example_customized-0.0.1-py3-none-any.whl",
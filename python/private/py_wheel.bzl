@@ -179,6 +179,19 @@ _other_attrs = {
     "classifiers": attr.string_list(
         doc = "A list of strings describing the categories for the package. For valid classifiers see https://pypi.org/classifiers",
     ),
+    "compression_level": attr.int(
+        default = 6,
+        values = list(range(10)),
+        doc = "The compression level (0-9) used with `compression_type = \"deflated\"`.",
+    ),
+    "compression_type": attr.string(
+        default = "deflated",
+        values = ["deflated", "stored"],
+        doc = ("How files are compressed in the archive. `stored` skips " +
+               "compression entirely, which makes building large wheels " +
+               "considerably faster at the cost of a bigger wheel, e.g. for " +
+               "local development."),
+    ),
     "description_content_type": attr.string(
         doc = ("The type of contents in description_file. " +
                "If not provided, the type will be inferred from the extension of description_file. " +
@@ -344,6 +357,8 @@ def _py_wheel_impl(ctx):
     args.add("--out", outfile)
     args.add("--name_file", name_file)
     args.add_all(ctx.attr.strip_path_prefixes, format_each = "--strip_path_prefix=%s")
+    args.add("--compression_type", ctx.attr.compression_type)
+    args.add("--compression_level", str(ctx.attr.compression_level))
     if not ctx.attr.incompatible_normalize_name:
         args.add("--noincompatible_normalize_name")
     if not ctx.attr.incompatible_normalize_version:
@@ -16,23 +16,69 @@ from __future__ import annotations
 
 import argparse
 import base64
+import collections
+import concurrent.futures
+import functools
 import hashlib
+import io
+import mmap
+import multiprocessing
+import operator
 import os
 import re
 import sys
 import zipfile
+import zlib
 from pathlib import Path
 
+try:
+    import deflate
+except ImportError:
+    # libdeflate bindings are optional; zlib is used when they are missing.
+    deflate = None
+
 _ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
 
+_PATH_SEPARATORS = os.path.sep + (os.path.altsep or "")
+
+# Size of the blocks that input files are compressed and hashed in.
+_BLOCK_SIZE = 1 << 20
+
+# Files at least this large are mapped into memory instead of being read
+# into a buffer. Below it, setting up the mapping costs more than it saves.
+_MMAP_THRESHOLD = 8 << 20
+
+# Not available on all platforms, e.g. Windows.
+_MADV_DONTNEED = getattr(mmap, "MADV_DONTNEED", None)
+
+_COMPRESSION_TYPES = {
+    "deflated": zipfile.ZIP_DEFLATED,
+    "stored": zipfile.ZIP_STORED,
+}
+
+_RE_FILENAME_SEG = re.compile(r"[^\w\d.]+", re.UNICODE)
+_RE_NAME_NORM = re.compile(r"[-_.]+")
+_RE_SANITIZE = re.compile(r"[^a-z0-9]+")
+_RE_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+_RE_METADATA_NAME = re.compile(rb"^Name: .*$", re.MULTILINE)
+
 
-def commonpath(path1, path2):
-    ret = []
-    for a, b in zip(path1.split(os.path.sep), path2.split(os.path.sep)):
-        if a != b:
-            break
-        ret.append(a)
-    return os.path.sep.join(ret)
+def _resolve_crc32():
+    """Pick the fastest available CRC-32 implementation.
+
+    libdeflate and ISA-L fold the CRC with carry-less multiplication
+    (PCLMULQDQ), which is considerably faster than zlib's table-driven one.
+    """
+    if deflate is not None:
+        return deflate.crc32
+    try:
+        from isal.isal_zlib import crc32
+    except ImportError:
+        return zlib.crc32
+    return crc32
+
+
+_crc32 = _resolve_crc32()
 
 
 def escape_filename_segment(segment):
@@ -42,7 +88,7 @@ def escape_filename_segment(segment):
     and may be removed in the future. See `escape_filename_distribution_name`
     and `normalize_pep440` for the modern alternatives.
     """
-    return re.sub(r"[^\w\d.]+", "_", segment, re.UNICODE)
+    return _RE_FILENAME_SEG.sub("_", segment)
 
 
 def normalize_package_name(name):
@@ -50,7 +96,7 @@ def normalize_package_name(name):
 
     See https://packaging.python.org/en/latest/specifications/name-normalization/
     """
-    return re.sub(r"[-_.]+", "-", name).lower()
+    return _RE_NAME_NORM.sub("-", name).lower()
 
 
 def escape_filename_distribution_name(name):
@@ -61,6 +107,15 @@ def escape_filename_distribution_name(name):
     return normalize_package_name(name).replace("-", "_")
 
 
+@functools.lru_cache(maxsize=None)
+def _packaging_version():
+    # Imported lazily, as only version normalization needs packaging.
+    import packaging.version
+
+    return packaging.version
+
+
+@functools.lru_cache(maxsize=None)
 def normalize_pep440(version):
     """Normalize version according to PEP 440, with fallback for placeholders.
 
@@ -79,20 +134,116 @@ def normalize_pep440(version):
 
     """
 
-    import packaging.version
+    packaging_version = _packaging_version()
 
     try:
-        return str(packaging.version.Version(version))
-    except packaging.version.InvalidVersion:
+        return str(packaging_version.Version(version))
+    except packaging_version.InvalidVersion:
         pass
 
-    sanitized = re.sub(r"[^a-z0-9]+", ".", version.lower()).strip(".")
-    substituted = re.sub(r"\{\w+\}", "0", version)
+    sanitized = _RE_SANITIZE.sub(".", version.lower()).strip(".")
+    substituted = _RE_PLACEHOLDER.sub("0", version)
     delimiter = "." if "+" in substituted else "+"
     try:
-        return str(packaging.version.Version(f"{substituted}{delimiter}{sanitized}"))
-    except packaging.version.InvalidVersion:
-        return str(packaging.version.Version(f"0+{sanitized}"))
+        return str(packaging_version.Version(f"{substituted}{delimiter}{sanitized}"))
+    except packaging_version.InvalidVersion:
+        return str(packaging_version.Version(f"0+{sanitized}"))
+
+
+def _walk_files(package_filename, real_filename):
+    """Yield (package_filename, real_filename) pairs for a file or a directory tree."""
+    if os.path.isdir(real_filename):
+        yield from _walk_directory(package_filename, real_filename)
+    else:
+        yield package_filename, real_filename
+
+
+def _walk_directory(package_dirname, real_dirname):
+    # The entries returned by scandir carry the file type, so unlike
+    # os.listdir + os.path.isdir this needs no extra stat() per entry.
+    with os.scandir(real_dirname) as entries:
+        for entry in entries:
+            package_filename = "{}/{}".format(package_dirname, entry.name)
+            if entry.is_dir():
+                yield from _walk_directory(package_filename, entry.path)
+            else:
+                yield package_filename, entry.path
+
+
+def _open_sequential(filename):
+    """Open a file for unbuffered reading from start to end."""
+    fsrc = open(filename, "rb", buffering=0)
+    if hasattr(os, "posix_fadvise"):
+        # Let the kernel read ahead more aggressively.
+        os.posix_fadvise(fsrc.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+    return fsrc
+
+
+def _compress_file(real_filename, *, compression, compresslevel, use_libdeflate):
+    """Read and compress a single file for the wheel archive.
+
+    This only depends on its arguments, so that it can run in a worker process.
+
+    Returns:
+        A (compressed, crc, file_size, digest) tuple, where digest is the
+        RECORD representation of the file's SHA-256.
+    """
+    with _open_sequential(real_filename) as fsrc:
+        data = fsrc.read()
+
+    return _compress_data(
+        data,
+        compression=compression,
+        compresslevel=compresslevel,
+        use_libdeflate=use_libdeflate,
+    )
+
+
+def _compress_data(data, *, compression, compresslevel, use_libdeflate):
+    """Compress the contents of a file, see `_compress_file`."""
+    if compression == zipfile.ZIP_STORED:
+        compressed = data
+    elif use_libdeflate:
+        compressed = deflate.deflate_compress(
+            data, 6 if compresslevel is None else compresslevel
+        )
+    else:
+        compressor = zlib.compressobj(
+            zlib.Z_DEFAULT_COMPRESSION if compresslevel is None else compresslevel,
+            zlib.DEFLATED,
+            -15,
+        )
+        compressed = compressor.compress(data) + compressor.flush()
+
+    digest = _WhlFile._serialize_digest(hashlib.sha256(data))
+    return compressed, _crc32(data), len(data), digest
+
+
+def _map_bounded(executor, fn, iterable, window):
+    """Like executor.map, but with at most `window` calls in flight.
+
+    Calls are only submitted as results are consumed, so that results which
+    can't be used yet don't pile up.
+    """
+    pending = collections.deque()
+    for item in iterable:
+        if len(pending) >= window:
+            yield pending.popleft().result()
+        pending.append(executor.submit(fn, item))
+    while pending:
+        yield pending.popleft().result()
+
+
+class _HashingWriter:
+    """File-like wrapper that hashes the data written through it."""
+
+    def __init__(self, inner, hash):
+        self._inner = inner
+        self._hash = hash
+
+    def write(self, block):
+        self._hash.update(block)
+        return self._inner.write(block)
 
 
 class _WhlFile(zipfile.ZipFile):
@@ -104,71 +255,249 @@ class _WhlFile(zipfile.ZipFile):
         distinfo_dir: str | Path,
         strip_path_prefixes=None,
         compression=zipfile.ZIP_DEFLATED,
+        use_libdeflate=False,
         **kwargs,
     ):
         self._distinfo_dir: str = Path(distinfo_dir).name
         self._strip_path_prefixes = strip_path_prefixes or []
-        # Entries for the RECORD file as (filename, hash, size) tuples.
-        self._record = []
+        self._use_libdeflate = use_libdeflate and deflate is not None
+        # Reused for every file streamed into the archive.
+        self._read_buffer = memoryview(bytearray(_BLOCK_SIZE))
+        # Contents of the RECORD file, written as entries are added.
+        self._record = io.BytesIO()
+        # The first entry written for each input file, as (ZipInfo, data
+        # offset, digest) keyed by (st_dev, st_ino), so that files packaged
+        # under several names are only compressed and hashed once.
+        self._written_files: dict[
+            tuple[int, int], tuple[zipfile.ZipInfo, int, bytes]
+        ] = {}
 
         super().__init__(filename, mode=mode, compression=compression, **kwargs)
 
     def distinfo_path(self, basename):
         return f"{self._distinfo_dir}/{basename}"
 
+    def _arcname_from(self, name):
+        # Always use unix path separators.
+        normalized_arcname = name.replace(os.path.sep, "/")
+        # Don't manipulate names filenames in the .distinfo directory.
+        if normalized_arcname.startswith(self._distinfo_dir):
+            return normalized_arcname
+        for prefix in self._strip_path_prefixes:
+            if normalized_arcname.startswith(prefix):
+                return normalized_arcname[len(prefix) :]
+
+        return normalized_arcname
+
+    def _compress_file_args(self):
+        return dict(
+            compression=self.compression,
+            compresslevel=self.compresslevel,
+            use_libdeflate=self._use_libdeflate,
+        )
+
     def add_file(self, package_filename, real_filename):
         """Add given file to the distribution."""
+        for package_filename, real_filename in _walk_files(
+            package_filename, real_filename
+        ):
+            self._add_single_file(self._arcname_from(package_filename), real_filename)
+
+    def add_files(self, files, jobs=1):
+        """Add (package_filename, real_filename) pairs to the distribution.
+
+        With more than one job, the files are compressed and hashed in a pool
+        of worker processes. The archive itself is still written in order on
+        the calling thread, so the output does not depend on `jobs`.
+        """
+        if jobs <= 1:
+            for package_filename, real_filename in files:
+                self.add_file(package_filename, real_filename)
+            return
 
-        def arcname_from(name):
-            # Always use unix path separators.
-            normalized_arcname = name.replace(os.path.sep, "/")
-            # Don't manipulate names filenames in the .distinfo directory.
-            if normalized_arcname.startswith(self._distinfo_dir):
-                return normalized_arcname
-            for prefix in self._strip_path_prefixes:
-                if normalized_arcname.startswith(prefix):
-                    return normalized_arcname[len(prefix) :]
+        entries = [
+            (
+                self._arcname_from(package_filename),
+                real_filename,
+                self._file_key(os.stat(real_filename)),
+            )
+            for package_path, real_path in files
+            for package_filename, real_filename in _walk_files(package_path, real_path)
+        ]
+        # Files packaged under several names only need compressing once.
+        seen = set(self._written_files)
+        to_compress = []
+        for _, real_filename, key in entries:
+            if key is None or key not in seen:
+                seen.add(key)
+                to_compress.append(real_filename)
+
+        compress = functools.partial(_compress_file, **self._compress_file_args())
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=jobs, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            # Each result holds a whole compressed file; keep enough queued
+            # to keep the workers busy, but no more.
+            results = _map_bounded(executor, compress, to_compress, window=2 * jobs)
+            for arcname, _, key in entries:
+                if key in self._written_files:
+                    self._copy_entry(arcname, *self._written_files[key])
+                    continue
+                compressed, crc, file_size, digest = next(results)
+                written = self.append_precompressed(
+                    arcname, compressed, crc, file_size, digest
+                )
+                self._remember_file(key, *written, digest)
 
-            return normalized_arcname
+    def append_precompressed(self, arcname, compressed, crc, file_size, digest):
+        """Add a file compressed by `_compress_file` to the distribution.
 
-        if os.path.isdir(real_filename):
-            directory_contents = os.listdir(real_filename)
-            for file_ in directory_contents:
-                self.add_file(
-                    "{}/{}".format(package_filename, file_),
-                    "{}/{}".format(real_filename, file_),
+        Returns:
+            The entry's ZipInfo and the offset of its data in the archive.
+        """
+        zinfo = self._zipinfo(arcname)
+        data_offset = self._write_precompressed(zinfo, compressed, crc, file_size)
+        self._add_to_record(arcname, digest, file_size)
+        return zinfo, data_offset
+
+    def _file_key(self, stat):
+        """Identify the file with the given stat result, or None to not deduplicate it."""
+        if not self._seekable or not self.fp.readable():
+            # Earlier entries can't be read back from the archive.
+            return None
+        if not stat.st_ino:
+            # Some filesystems don't provide inode numbers.
+            return None
+        return stat.st_dev, stat.st_ino
+
+    def _remember_file(self, key, zinfo, data_offset, digest):
+        if key is not None:
+            self._written_files[key] = (zinfo, data_offset, digest)
+
+    def _copy_entry(self, arcname, source, data_offset, digest):
+        """Add arcname with the same contents as an entry already in the archive."""
+        self.fp.seek(data_offset)
+        compressed = self.fp.read(source.compress_size)
+
+        zinfo = self._zipinfo(arcname)
+        zinfo.compress_type = source.compress_type
+        self._write_precompressed(zinfo, compressed, source.CRC, source.file_size)
+        self._add_to_record(arcname, digest, source.file_size)
+
+    def _add_single_file(self, arcname, real_filename):
+        with _open_sequential(real_filename) as fsrc:
+            stat = os.fstat(fsrc.fileno())
+            key = self._file_key(stat)
+            if key in self._written_files:
+                self._copy_entry(arcname, *self._written_files[key])
+                return
+
+            if self._use_libdeflate and self.compression == zipfile.ZIP_DEFLATED:
+                # libdeflate only compresses whole buffers, so read the file at once.
+                compressed, crc, file_size, digest = _compress_data(
+                    fsrc.read(), **self._compress_file_args()
                 )
-            return
+                zinfo, data_offset = self.append_precompressed(
+                    arcname, compressed, crc, file_size, digest
+                )
+            else:
+                zinfo, data_offset, digest = self._stream_file(
+                    arcname, fsrc, stat.st_size
+                )
+        self._remember_file(key, zinfo, data_offset, digest)
 
-        arcname = arcname_from(package_filename)
+    def _stream_file(self, arcname, fsrc, size):
+        """Compress and hash the open file fsrc of the given size into the archive.
+
+        Returns:
+            The entry's ZipInfo, the offset of its data in the archive and
+            its RECORD digest.
+        """
         zinfo = self._zipinfo(arcname)
 
-        # Write file to the zip archive while computing the hash and length
+        # Write file to the zip archive while computing the hash, so that
+        # each block is compressed and hashed in a single pass.
         hash = hashlib.sha256()
-        size = 0
-        with open(real_filename, "rb") as fsrc:
-            with self.open(zinfo, "w") as fdst:
+        buffer = self._read_buffer
+        with self.open(zinfo, "w") as fdst:
+            # The local file header has been written, the data starts here.
+            data_offset = self.fp.tell()
+            writer = _HashingWriter(fdst, hash)
+            if size >= _MMAP_THRESHOLD:
+                with mmap.mmap(fsrc.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    self._write_mapped(writer, mapped)
+            else:
                 while True:
-                    block = fsrc.read(2**20)
-                    if not block:
+                    length = fsrc.readinto(buffer)
+                    if not length:
                         break
-                    fdst.write(block)
-                    hash.update(block)
-                    size += len(block)
-
-        self._add_to_record(arcname, self._serialize_digest(hash), size)
+                    writer.write(buffer[:length])
+
+        digest = self._serialize_digest(hash)
+        self._add_to_record(arcname, digest, size)
+        return zinfo, data_offset, digest
+
+    @staticmethod
+    def _write_mapped(writer, mapped):
+        # Write in blocks, so that the compressor's output stays bounded by
+        # the block size, and drop each block from the mapping once written
+        # so the mapped pages don't pile up in the process' resident set.
+        with memoryview(mapped) as view:
+            for offset in range(0, len(view), _BLOCK_SIZE):
+                block = view[offset : offset + _BLOCK_SIZE]
+                writer.write(block)
+                if _MADV_DONTNEED is not None:
+                    mapped.madvise(_MADV_DONTNEED, offset, len(block))
+                block.release()
 
     def add_string(self, filename, contents):
         """Add given 'contents' as filename to the distribution."""
-        if sys.version_info[0] > 2 and isinstance(contents, str):
+        self._write_entry(filename, contents)
+
+    def _write_entry(self, filename, contents, compute_hash=True):
+        if isinstance(contents, str):
             contents = contents.encode("utf-8", "surrogateescape")
         zinfo = self._zipinfo(filename)
         self.writestr(zinfo, contents)
-        hash = hashlib.sha256()
-        hash.update(contents)
-        self._add_to_record(filename, self._serialize_digest(hash), len(contents))
-
-    def _serialize_digest(self, hash):
+        if compute_hash:
+            hash = hashlib.sha256()
+            hash.update(contents)
+            self._add_to_record(filename, self._serialize_digest(hash), len(contents))
+
+    def _write_precompressed(self, zinfo, compressed, crc, file_size):
+        """Write an entry whose contents were compressed outside of zipfile.
+
+        This mirrors ZipFile.open(zinfo, "w"), except that the CRC and sizes
+        are known upfront and go straight into the local file header.
+
+        Returns:
+            The offset of the entry's data in the archive.
+        """
+        if self._writing:
+            raise ValueError(
+                "Can't write to ZIP archive while an open writing handle exists."
+            )
+        zinfo.flag_bits = 0x00
+        zinfo.CRC = crc
+        zinfo.file_size = file_size
+        zinfo.compress_size = len(compressed)
+        zip64 = max(file_size, len(compressed)) > zipfile.ZIP64_LIMIT
+        with self._lock:
+            if self._seekable:
+                self.fp.seek(self.start_dir)
+            zinfo.header_offset = self.fp.tell()
+            self._writecheck(zinfo)
+            self._didModify = True
+            self.fp.write(zinfo.FileHeader(zip64))
+            data_offset = self.fp.tell()
+            self.fp.write(compressed)
+            self.start_dir = self.fp.tell()
+            self.filelist.append(zinfo)
+            self.NameToInfo[zinfo.filename] = zinfo
+        return data_offset
+
+    @staticmethod
+    def _serialize_digest(hash):
         # https://www.python.org/dev/peps/pep-0376/#record
         # "base64.urlsafe_b64encode(digest) with trailing = removed"
         digest = base64.urlsafe_b64encode(hash.digest())
@@ -176,34 +505,31 @@ class _WhlFile(zipfile.ZipFile):
         return digest
 
     def _add_to_record(self, filename, hash, size):
-        size = str(size).encode("ascii")
-        self._record.append((filename, hash, size))
+        if isinstance(filename, str):
+            filename = filename.lstrip("/").encode("utf-8", "surrogateescape")
+        self._record.write(b"%s,%s,%d\n" % (filename, hash, size))
 
     def _zipinfo(self, filename):
         """Construct deterministic ZipInfo entry for a file named filename"""
         # Strip leading path separators to mirror ZipInfo.from_file behavior
-        separators = os.path.sep
-        if os.path.altsep is not None:
-            separators += os.path.altsep
-        arcname = filename.lstrip(separators)
+        arcname = filename.lstrip(_PATH_SEPARATORS)
 
         zinfo = zipfile.ZipInfo(filename=arcname, date_time=_ZIP_EPOCH)
         zinfo.create_system = 3  # ZipInfo entry created on a unix-y system
         zinfo.external_attr = 0o777 << 16  # permissions: rwxrwxrwx
         zinfo.compress_type = self.compression
+        zinfo._compresslevel = self.compresslevel
         return zinfo
 
     def add_recordfile(self):
         """Write RECORD file to the distribution."""
         record_path = self.distinfo_path("RECORD")
-        entries = self._record + [(record_path, b"", b"")]
-        contents = b""
-        for filename, digest, size in entries:
-            if sys.version_info[0] > 2 and isinstance(filename, str):
-                filename = filename.lstrip("/").encode("utf-8", "surrogateescape")
-            contents += b"%s,%s,%s\n" % (filename, digest, size)
-
-        self.add_string(record_path, contents)
+        # RECORD does not list a hash or size for itself.
+        contents = self._record.getvalue() + b"%s,,\n" % record_path.encode(
+            "utf-8", "surrogateescape"
+        )
+
+        self._write_entry(record_path, contents, compute_hash=False)
         return contents
 
 
@@ -220,6 +546,9 @@ class WheelMaker(object):
         strip_path_prefixes=None,
         incompatible_normalize_name=True,
         incompatible_normalize_version=True,
+        compression=zipfile.ZIP_DEFLATED,
+        compresslevel=6,
+        use_libdeflate=False,
     ):
         self._name = name
         self._version = version
@@ -229,6 +558,9 @@ class WheelMaker(object):
         self._platform = platform
         self._outfile = outfile
         self._strip_path_prefixes = strip_path_prefixes
+        self._compression = compression
+        self._compresslevel = compresslevel
+        self._use_libdeflate = use_libdeflate
 
         if incompatible_normalize_version:
             self._version = normalize_pep440(self._version)
@@ -262,6 +594,9 @@ class WheelMaker(object):
             mode="w",
             distinfo_dir=self._distinfo_dir,
             strip_path_prefixes=self._strip_path_prefixes,
+            compression=self._compression,
+            compresslevel=self._compresslevel,
+            use_libdeflate=self._use_libdeflate,
         )
         return self
 
@@ -294,6 +629,10 @@ class WheelMaker(object):
         """Add given file to the distribution."""
         self._whlfile.add_file(package_filename, real_filename)
 
+    def add_files(self, files, jobs=1):
+        """Add given (package_filename, real_filename) pairs to the distribution."""
+        self._whlfile.add_files(files, jobs=jobs)
+
     def add_wheelfile(self):
         """Write WHEEL file to the distribution"""
         # TODO(pstradomski): Support non-purelib wheels.
@@ -309,15 +648,25 @@ Root-Is-Purelib: {}
         self._whlfile.add_string(self.distinfo_path("WHEEL"), wheel_contents)
 
     def add_metadata(self, metadata, name, description, version):
-        """Write METADATA file to the distribution."""
+        """Write METADATA file to the distribution.
+
+        `metadata` and `description` may be bytes, which are written as-is,
+        or str, which is encoded as UTF-8 first.
+        """
         # https://www.python.org/dev/peps/pep-0566/
         # https://packaging.python.org/specifications/core-metadata/
-        metadata = re.sub("^Name: .*$", "Name: %s" % name, metadata, flags=re.MULTILINE)
-        metadata += "Version: %s\n\n" % version
+        if isinstance(metadata, str):
+            metadata = metadata.encode("utf-8", "surrogateescape")
+        if isinstance(description, str):
+            description = description.encode("utf-8", "surrogateescape")
+        metadata = _RE_METADATA_NAME.sub(
+            b"Name: %s" % name.encode("utf-8", "surrogateescape"), metadata
+        )
+        metadata += b"Version: %s\n\n" % version.encode("utf-8", "surrogateescape")
         # setuptools seems to insert UNKNOWN as description when none is
         # provided.
-        metadata += description if description else "UNKNOWN"
-        metadata += "\n"
+        metadata += description if description else b"UNKNOWN"
+        metadata += b"\n"
         self._whlfile.add_string(self.distinfo_path("METADATA"), metadata)
 
     def add_recordfile(self):
@@ -325,42 +674,71 @@ Root-Is-Purelib: {}
         self._whlfile.add_recordfile()
 
 
+def _split_input_file(input_file):
+    """Split a 'package_path;real_path' argument at its first ';'."""
+    package_path, separator, real_path = input_file.partition(";")
+    if not separator:
+        raise ValueError(
+            f"Expected a 'package_path;real_path' pair, got {input_file!r}"
+        )
+    return package_path, real_path
+
+
 def get_files_to_package(input_files):
     """Find files to be added to the distribution.
 
     input_files: list of pairs (package_path, real_path)
     """
-    files = {}
-    for package_path, real_path in input_files:
-        files[package_path] = real_path
-    return files
+    return {package_path: real_path for package_path, real_path in input_files}
 
 
-def resolve_argument_stamp(
-    argument: str, volatile_status_stamp: Path, stable_status_stamp: Path
-) -> str:
-    """Resolve workspace status stamps format strings found in the argument string
+def _read_text_bytes(path):
+    """Read a UTF-8 text file without decoding it.
+
+    Line endings are normalized the same way as when reading in text mode.
+    """
+    with open(path, "rb") as f:
+        contents = f.read()
+    return contents.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+
+
+def _load_stamps(
+    volatile_status_stamp: Path, stable_status_stamp: Path
+) -> dict[str, str]:
+    """Parse the workspace status files into a mapping of stamp keys to values
 
     Args:
-        argument (str): The raw argument represenation for the wheel (may include stamp variables)
         volatile_status_stamp (Path): The path to a volatile workspace status file
         stable_status_stamp (Path): The path to a stable workspace status file
 
+    Returns:
+        dict[str, str]: The stamp values. If a key is listed more than once,
+        the first value wins, with the volatile file read first.
+    """
+    stamps = {}
+    for status_file in (volatile_status_stamp, stable_status_stamp):
+        for line in status_file.read_text(encoding="utf-8").splitlines():
+            if not line:
+                continue
+            key, value = line.split(" ", maxsplit=1)
+            stamps.setdefault(key, value)
+
+    return stamps
+
+
+def resolve_argument_stamp(argument: str, stamps: dict[str, str]) -> str:
+    """Resolve workspace status stamps format strings found in the argument string
+
+    Args:
+        argument (str): The raw argument represenation for the wheel (may include stamp variables)
+        stamps (dict[str, str]): The workspace status values, see `_load_stamps`
+
     Returns:
         str: A resolved argument string
     """
-    lines = (
-        volatile_status_stamp.read_text().splitlines()
-        + stable_status_stamp.read_text().splitlines()
+    return _RE_PLACEHOLDER.sub(
+        lambda match: stamps.get(match.group(1), match.group(0)), argument
     )
-    for line in lines:
-        if not line:
-            continue
-        key, value = line.split(" ", maxsplit=1)
-        stamp = "{" + key + "}"
-        argument = argument.replace(stamp, value)
-
-    return argument
 
 
 def parse_args() -> argparse.Namespace:
@@ -407,6 +785,27 @@ def parse_args() -> argparse.Namespace:
         help="Path prefix to be stripped from input package files' path. "
         "Can be supplied multiple times. Evaluated in order.",
     )
+    output_group.add_argument(
+        "--compression_type",
+        choices=sorted(_COMPRESSION_TYPES),
+        default="deflated",
+        help="Compression method of the wheel archive. 'stored' skips "
+        "compression entirely, which is useful for fast development builds.",
+    )
+    output_group.add_argument(
+        "--compression_level",
+        type=int,
+        choices=range(10),
+        default=6,
+        metavar="{0..9}",
+        help="Compression level used with the 'deflated' compression type.",
+    )
+    output_group.add_argument(
+        "--use_libdeflate",
+        action="store_true",
+        help="Compress files with libdeflate instead of zlib, if the "
+        "'deflate' package is available.",
+    )
 
     wheel_group = parser.add_argument_group("Wheel metadata")
     wheel_group.add_argument(
@@ -458,6 +857,15 @@ def parse_args() -> argparse.Namespace:
         type=Path,
         help="Pass in the stamp info file for stamping",
     )
+    build_group.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes used to compress the input files. "
+        "Each worker holds a whole input file and its compressed form in "
+        "memory, so peak memory grows with the number of jobs and the size "
+        "of the largest inputs.",
+    )
 
     feature_group = parser.add_argument_group("Feature flags")
     feature_group.add_argument("--noincompatible_normalize_name", action="store_true")
@@ -472,44 +880,38 @@ def main() -> None:
     arguments = parse_args()
 
     if arguments.input_file:
-        input_files = [i.split(";") for i in arguments.input_file]
+        input_files = [_split_input_file(i) for i in arguments.input_file]
     else:
         input_files = []
 
     if arguments.extra_distinfo_file:
-        extra_distinfo_file = [i.split(";") for i in arguments.extra_distinfo_file]
+        extra_distinfo_file = [
+            _split_input_file(i) for i in arguments.extra_distinfo_file
+        ]
     else:
         extra_distinfo_file = []
 
     if arguments.input_file_list:
         for input_file in arguments.input_file_list:
-            with open(input_file) as _file:
+            with open(input_file, encoding="utf-8") as _file:
                 input_file_list = _file.read().splitlines()
             for _input_file in input_file_list:
-                input_files.append(_input_file.split(";"))
+                input_files.append(_split_input_file(_input_file))
 
     all_files = get_files_to_package(input_files)
     # Sort the files for reproducible order in the archive.
-    all_files = sorted(all_files.items())
+    all_files = sorted(all_files.items(), key=operator.itemgetter(0))
 
     strip_prefixes = [p for p in arguments.strip_path_prefix]
 
     if arguments.volatile_status_file and arguments.stable_status_file:
-        name = resolve_argument_stamp(
-            arguments.name,
-            arguments.volatile_status_file,
-            arguments.stable_status_file,
+        stamps = _load_stamps(
+            arguments.volatile_status_file, arguments.stable_status_file
         )
+        name = resolve_argument_stamp(arguments.name, stamps)
+        version = resolve_argument_stamp(arguments.version, stamps)
     else:
         name = arguments.name
-
-    if arguments.volatile_status_file and arguments.stable_status_file:
-        version = resolve_argument_stamp(
-            arguments.version,
-            arguments.volatile_status_file,
-            arguments.stable_status_file,
-        )
-    else:
         version = arguments.version
 
     with WheelMaker(
@@ -523,29 +925,18 @@ def main() -> None:
         strip_path_prefixes=strip_prefixes,
         incompatible_normalize_name=not arguments.noincompatible_normalize_name,
         incompatible_normalize_version=not arguments.noincompatible_normalize_version,
+        compression=_COMPRESSION_TYPES[arguments.compression_type],
+        compresslevel=arguments.compression_level,
+        use_libdeflate=arguments.use_libdeflate,
     ) as maker:
-        for package_filename, real_filename in all_files:
-            maker.add_file(package_filename, real_filename)
+        maker.add_files(all_files, jobs=arguments.jobs)
         maker.add_wheelfile()
 
         description = None
         if arguments.description_file:
-            if sys.version_info[0] == 2:
-                with open(arguments.description_file, "rt") as description_file:
-                    description = description_file.read()
-            else:
-                with open(
-                    arguments.description_file, "rt", encoding="utf-8"
-                ) as description_file:
-                    description = description_file.read()
-
-        metadata = None
-        if sys.version_info[0] == 2:
-            with open(arguments.metadata_file, "rt") as metadata_file:
-                metadata = metadata_file.read()
-        else:
-            with open(arguments.metadata_file, "rt", encoding="utf-8") as metadata_file:
-                metadata = metadata_file.read()
+            description = _read_text_bytes(arguments.description_file)
+
+        metadata = _read_text_bytes(arguments.metadata_file)
 
         if arguments.noincompatible_normalize_version:
             version_in_metadata = version
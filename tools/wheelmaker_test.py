@@ -0,0 +1,249 @@
+# Copyright 2023 The Bazel Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import base64
+import hashlib
+import io
+import os
+import pathlib
+import shutil
+import tempfile
+import types
+import unittest
+import zipfile
+import zlib
+from unittest import mock
+
+from tools import wheelmaker
+
+
+def _fake_deflate_compress(data, compresslevel):
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+class WheelMakerTest(unittest.TestCase):
+    def setUp(self):
+        self.maxDiff = None
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = pathlib.Path(tmpdir.name)
+
+        src = self.tmpdir / "src"
+        (src / "pkg").mkdir(parents=True)
+        (src / "pkg" / "__init__.py").write_bytes(b"")
+        (src / "pkg" / "module.py").write_text("def f():\n    return 42\n" * 100)
+        # Larger than a read block, and only partly compressible.
+        (src / "pkg" / "data.bin").write_bytes(
+            os.urandom(1 << 20) + b"abcdefgh" * (1 << 18)
+        )
+        self.metadata_file = self.tmpdir / "METADATA"
+        self.metadata_file.write_text("Metadata-Version: 2.1\n")
+
+        self.input_files = [
+            ("pkg/__init__.py", src / "pkg" / "__init__.py"),
+            ("pkg/data.bin", src / "pkg" / "data.bin"),
+            ("pkg/module.py", src / "pkg" / "module.py"),
+        ]
+
+    def _build_wheel(self, *args, input_files=None):
+        """Run wheelmaker with the given extra arguments and return the wheel."""
+        out = self.tmpdir / "out.whl"
+        argv = [
+            "wheelmaker",
+            "--name=example",
+            "--version=0.0.1",
+            f"--out={out}",
+            f"--name_file={self.tmpdir / 'name'}",
+            f"--metadata_file={self.metadata_file}",
+        ]
+        for package_path, real_path in input_files or self.input_files:
+            argv.append(f"--input_file={package_path};{real_path}")
+        argv.extend(args)
+
+        with mock.patch("sys.argv", argv):
+            wheelmaker.main()
+
+        contents = out.read_bytes()
+        out.unlink()
+        return contents
+
+    def assertValidWheel(self, contents):
+        with zipfile.ZipFile(io.BytesIO(contents)) as whl:
+            self.assertIsNone(whl.testzip())
+
+            record = whl.read("example-0.0.1.dist-info/RECORD").decode("utf-8")
+            expected = []
+            for name in whl.namelist():
+                if name.endswith("/RECORD"):
+                    expected.append(f"{name},,")
+                    continue
+                data = whl.read(name)
+                digest = base64.urlsafe_b64encode(hashlib.sha256(data).digest())
+                expected.append(
+                    f"{name},sha256={digest.decode('ascii').rstrip('=')},{len(data)}"
+                )
+            self.assertEqual(expected, record.splitlines())
+
+    def assertMatchesZipfile(self, contents, compression, compresslevel):
+        """Check that stock zipfile writes the same entries byte for byte."""
+        reference = io.BytesIO()
+        with zipfile.ZipFile(io.BytesIO(contents)) as whl, zipfile.ZipFile(
+            reference, "w"
+        ) as expected:
+            for name in whl.namelist():
+                zinfo = zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0))
+                zinfo.create_system = 3
+                zinfo.external_attr = 0o777 << 16
+                expected.writestr(
+                    zinfo,
+                    whl.read(name),
+                    compress_type=compression,
+                    compresslevel=compresslevel,
+                )
+        self.assertEqual(reference.getvalue(), contents)
+
+    def test_default(self):
+        contents = self._build_wheel()
+
+        self.assertValidWheel(contents)
+        self.assertMatchesZipfile(contents, zipfile.ZIP_DEFLATED, 6)
+        with zipfile.ZipFile(io.BytesIO(contents)) as whl:
+            self.assertEqual(
+                [
+                    "pkg/__init__.py",
+                    "pkg/data.bin",
+                    "pkg/module.py",
+                    "example-0.0.1.dist-info/WHEEL",
+                    "example-0.0.1.dist-info/METADATA",
+                    "example-0.0.1.dist-info/RECORD",
+                ],
+                whl.namelist(),
+            )
+
+    def test_compression_stored(self):
+        contents = self._build_wheel("--compression_type=stored")
+
+        self.assertValidWheel(contents)
+        self.assertMatchesZipfile(contents, zipfile.ZIP_STORED, None)
+        with zipfile.ZipFile(io.BytesIO(contents)) as whl:
+            for zinfo in whl.infolist():
+                self.assertEqual(zipfile.ZIP_STORED, zinfo.compress_type)
+
+    def test_compression_level(self):
+        contents = self._build_wheel("--compression_level=1")
+
+        self.assertValidWheel(contents)
+        self.assertMatchesZipfile(contents, zipfile.ZIP_DEFLATED, 1)
+        self.assertNotEqual(self._build_wheel(), contents)
+
+    def test_jobs(self):
+        for args in [(), ("--compression_type=stored",), ("--compression_level=1",)]:
+            with self.subTest(args=args):
+                expected = self._build_wheel(*args)
+                contents = self._build_wheel("--jobs=2", *args)
+
+                self.assertValidWheel(contents)
+                self.assertEqual(expected, contents)
+
+    def test_mmap(self):
+        expected = self._build_wheel()
+        with mock.patch.object(wheelmaker, "_MMAP_THRESHOLD", 1 << 20):
+            contents = self._build_wheel()
+
+        self.assertEqual(expected, contents)
+
+    def test_libdeflate(self):
+        fake_deflate = types.SimpleNamespace(
+            deflate_compress=mock.Mock(side_effect=_fake_deflate_compress),
+            crc32=zlib.crc32,
+        )
+        expected = self._build_wheel()
+        with mock.patch.object(wheelmaker, "deflate", fake_deflate):
+            contents = self._build_wheel("--use_libdeflate")
+
+        self.assertEqual(3, fake_deflate.deflate_compress.call_count)
+        self.assertValidWheel(contents)
+        self.assertEqual(expected, contents)
+
+    def test_libdeflate_unavailable(self):
+        expected = self._build_wheel()
+        with mock.patch.object(wheelmaker, "deflate", None):
+            contents = self._build_wheel("--use_libdeflate")
+
+        self.assertEqual(expected, contents)
+
+    def test_same_file_under_two_names(self):
+        data = self.tmpdir / "src" / "pkg" / "data.bin"
+        copy = self.tmpdir / "copy.bin"
+        shutil.copyfile(data, copy)
+
+        for args in [(), ("--jobs=2",), ("--compression_type=stored",)]:
+            with self.subTest(args=args):
+                expected = self._build_wheel(
+                    *args,
+                    input_files=self.input_files + [("pkg/data2.bin", copy)],
+                )
+                contents = self._build_wheel(
+                    *args,
+                    input_files=self.input_files + [("pkg/data2.bin", data)],
+                )
+
+                self.assertValidWheel(contents)
+                self.assertEqual(expected, contents)
+                with zipfile.ZipFile(io.BytesIO(contents)) as whl:
+                    self.assertEqual(
+                        whl.read("pkg/data.bin"), whl.read("pkg/data2.bin")
+                    )
+
+        # Entries can't be read back from a write-only archive, so it gets
+        # no deduplication, but the output must not change.
+        files = self.input_files + [("pkg/data2.bin", data)]
+        out = self.tmpdir / "out.whl"
+        for jobs in [1, 2]:
+            with self.subTest(jobs=jobs, fileobj="write-only"):
+                with wheelmaker._WhlFile(
+                    out, mode="w", distinfo_dir="example-0.0.1.dist-info"
+                ) as whl:
+                    whl.add_files(files, jobs=jobs)
+                    whl.add_recordfile()
+                expected = out.read_bytes()
+
+                with open(out, "wb") as fileobj, wheelmaker._WhlFile(
+                    fileobj, mode="w", distinfo_dir="example-0.0.1.dist-info"
+                ) as whl:
+                    whl.add_files(files, jobs=jobs)
+                    whl.add_recordfile()
+
+                contents = out.read_bytes()
+                self.assertValidWheel(contents)
+                self.assertEqual(expected, contents)
+
+    def test_input_file_without_separator(self):
+        with self.assertRaisesRegex(ValueError, "'pkg/extra.py'"):
+            self._build_wheel("--input_file=pkg/extra.py")
+
+
+class EscapeFilenameSegmentTest(unittest.TestCase):
+    def test_escapes_every_run(self):
+        # More runs of invalid characters than re.sub's old count of 32.
+        segment = "a~~b-" * 40
+        self.assertEqual("a_b_" * 40, wheelmaker.escape_filename_segment(segment))
+
+    def test_keeps_unicode_letters(self):
+        self.assertEqual("żółw_1.0", wheelmaker.escape_filename_segment("żółw-1.0"))
+
+
+if __name__ == "__main__":
+    unittest.main()